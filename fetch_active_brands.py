@@ -1,35 +1,112 @@
 import os
+import re
 import time
-import json
+import sqlite3
+import threading
 from datetime import datetime, timedelta
+from functools import lru_cache
+from urllib.parse import urlparse
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from collections import defaultdict
+from collections import Counter, defaultdict, deque
 
+import orjson
 import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 import pandas as pd
 from dotenv import load_dotenv
 import gspread
+from gspread.utils import absolute_range_name, rowcol_to_a1
 from google.oauth2.service_account import Credentials
-from gspread_dataframe import set_with_dataframe
 
 load_dotenv()
 
+# Brand-name noise stripped during normalization. Order matters: terms are removed one
+# after another (e.g. 'a ' goes before 'india'), so this can't collapse into one alternation
+_BRAND_NOISE_TERMS = ('pvt ltd', 'private limited', 'pvt. ltd.', 'private ltd',
+                      'llp', 'opc', 'limited', 'ltd', 'inc', 'corp',
+                      '- current', '- new', '- old', 'domestic', 'export',
+                      'the ', 'a ', 'an ', 'international', 'india')
+_NON_ALNUM_RE = re.compile(r'[^\w\s]|_')  # Same set as "not isalnum() and not isspace()"
+_SHEET_TIMESTAMP_RE = re.compile(r'\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}')  # Format we write Timestamp in
+
+
+class RateLimiter:
+    """Thread-safe token bucket - only slows callers down when they outpace the rate"""
+    
+    def __init__(self, rate, burst=None):
+        self.base_rate = self.rate = rate
+        self.burst = burst or rate
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.throttled_until = 0
+        self.lock = threading.Lock()
+    
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if self.throttled_until and now >= self.throttled_until:
+                    self.rate, self.throttled_until = self.base_rate, 0
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+    
+    def throttle(self, cooldown=60):
+        """Halve the rate for `cooldown` seconds after the API pushes back with 429s"""
+        with self.lock:
+            self.rate = max(self.base_rate / 8, self.rate / 2)
+            self.throttled_until = time.monotonic() + cooldown
+
 
 class UltraFastMetaActivityTracker:
     """Ultra-fast tracker with Batch API + Caching (5-10x faster)"""
     
-    EXCLUDED_EVENT_TYPES = {
+    EXCLUDED_EVENT_TYPES = frozenset({
         'ad_account_billing_charge', 'ad_account_billing_charge_failed',
         'ad_account_billing_decline', 'ad_review_approved', 'ad_review_declined',
         'automatic_placement_optimization', 'campaign_budget_optimization_auto',
         'auto_bid_adjustment', 'delivery_insights_notification'
-    }
+    })
+    AUTOMATED_ACTORS = frozenset({'meta', 'facebook', 'system', 'automated', ''})
+    
+    OBJECT_CACHE_TTL = 600   # Seconds before a cached campaign/adset/ad is refetched
+    MISSING_OBJECT_TTL = 60  # Shorter TTL for ids that came back empty
+    DISK_CACHE_TTL = 13 * 3600  # Just over the 12h schedule, so a run reuses only the previous run's objects
+    DISK_MISSING_TTL = 30 * 60
+    
+    EMPTY_HIERARCHY = {
+        'Campaign_Name': 'N/A', 'Campaign_Status': 'N/A', 'Campaign_Objective': 'N/A',
+        'Campaign_Budget_Type': 'N/A', 'Campaign_Budget': 'N/A', 'Campaign_Bid_Strategy': 'N/A',
+        'AdSet_Name': 'N/A', 'AdSet_Status': 'N/A', 'AdSet_Optimization_Goal': 'N/A',
+        'AdSet_Billing_Event': 'N/A', 'Age_Targeting': 'N/A', 'Gender_Targeting': 'N/A',
+        'Location_Targeting': 'N/A', 'Ad_Name': 'N/A', 'Ad_Status': 'N/A',
+        'Ad_Preview_Link': 'N/A', 'Hierarchy_Level': 'UNKNOWN'
+    }  # Copied per activity; never mutate in place
+    HIERARCHY_FIELDS = tuple(k for k in EMPTY_HIERARCHY if k != 'Hierarchy_Level')
+    ACTIVITY_COLUMNS = ('Brand', 'Account_ID', 'Account_Name', 'Account_Status', 'Actor', 'Action',
+                        'Hierarchy_Level', 'Timestamp') + HIERARCHY_FIELDS + (
+                        'Changed_From', 'Changed_To', 'Object_Name', 'Object_ID',
+                        'Object_Type_Raw', 'Raw_Event_Type')
+    OUTPUT_COLUMNS = ('Brand', 'Matched_Airtable_Brand', 'FB_Manager', 'Brand_Manager', 'Current_Team',
+                      'Actor', 'Action', 'Hierarchy_Level', 'Timestamp') + HIERARCHY_FIELDS + (
+                      'Changed_From', 'Changed_To', 'Account_ID', 'Account_Name', 'Account_Status',
+                      'Object_Name', 'Object_ID', 'Object_Type_Raw', 'Raw_Event_Type', 'Fetch_Date')
+    # Few distinct values across many rows; Airtable-sourced columns are left out as they may hold lists/dicts
+    CATEGORY_COLUMNS = ('Brand', 'Actor', 'Action', 'Hierarchy_Level', 'Account_ID',
+                        'Campaign_Status', 'AdSet_Status', 'Ad_Status')
+    DEDUP_KEY_COLUMNS = ('Account_ID', 'Object_Name', 'Timestamp', 'Action')
+    SHEET_WRITE_CHUNK = 5000  # Rows per Sheets insert request, keeps each payload well under the 10 MB cap
     
     def __init__(self, meta_access_token, airtable_token, airtable_base_id,
                  airtable_table_name, google_credentials_path=None,
-                 google_spreadsheet_id=None, max_workers=10, debug_mode=False):
+                 google_spreadsheet_id=None, max_workers=10, debug_mode=False, cache_path=None):
+        
+        self.max_workers = max_workers
         
         self.meta_access_token = meta_access_token
         self.meta_base_url = "https://graph.facebook.com/v18.0"
@@ -40,70 +117,98 @@ class UltraFastMetaActivityTracker:
         self.airtable_table_name = airtable_table_name
         self.airtable_url = f'https://api.airtable.com/v0/{airtable_base_id}/{airtable_table_name}'
         
+        # Airtable allows 5 req/s per base; Meta's limits are hourly, this just smooths bursts
+        self.rate_limiters = {'api.airtable.com': RateLimiter(5), 'graph.facebook.com': RateLimiter(25)}
+        
         self.google_credentials_path = google_credentials_path
         self.google_spreadsheet_id = google_spreadsheet_id
         self.gspread_client = self.setup_google_sheets() if google_credentials_path else None
+        self.spreadsheet = None  # Opened lazily, then reused by every sheet read/write
+        self.worksheet_cache = {}
+        self.pending_logs = []  # GitHub_Actions_Log rows, appended in one request at each step boundary of run()
         
-        self.max_workers = max_workers
         self.brand_mapping_df = None
         self.brand_mapping_dict = {}
+        self.fuzzy_brand_keys = []  # Normalized brands long enough (>=5 chars) for substring matching
+        self.brand_match_cache = {}  # Raw brand -> match, so each distinct brand is matched once
+        self.brand_gram_index = {}  # 5-char window -> positions in fuzzy_brand_keys of keys containing it
+        self.brand_prefix_index = {}  # First 5 chars -> positions in fuzzy_brand_keys
         self.debug_mode = debug_mode
         
         # CACHING for massive speed improvement
         self.campaign_cache = {}
         self.adset_cache = {}
         self.ad_cache = {}
+        self.cache_fetched_at = {}  # (kind, id) -> fetch time, hits and misses alike
+        self.disk_cache = self._open_disk_cache(cache_path) if cache_path else None
+        self.disk_cache_lock = threading.Lock()
+        # Account and prefetch threads share the object caches and debug_stats counters
+        self.state_lock = threading.Lock()
         
         self.debug_stats = {
             'accounts_total': 0, 'accounts_active': 0, 'accounts_inactive': 0,
             'accounts_with_activity': 0, 'duplicate_brands': {},
-            'object_types_found': {}, 'hierarchy_built': {'campaign_group': 0, 'campaign': 0, 'adgroup': 0},
-            'api_calls': {'campaign': 0, 'adset': 0, 'ad': 0, 'batch': 0},
-            'cache_hits': {'campaign': 0, 'adset': 0, 'ad': 0},
-            'hierarchy_errors': [], 'activities_filtered_out': 0, 'activities_included': 0,
-            'api_errors': {'400': 0, '403': 0, '404': 0, '500': 0, 'other': 0},
-            'skipped_objects': [], 'batch_savings': 0
+            'object_types_found': Counter(), 'hierarchy_built': Counter({'campaign_group': 0, 'campaign': 0, 'adgroup': 0}),
+            'api_calls': Counter({'campaign': 0, 'adset': 0, 'ad': 0, 'batch': 0}),
+            'cache_hits': Counter({'campaign': 0, 'adset': 0, 'ad': 0}),
+            'hierarchy_errors': deque(maxlen=1000), 'activities_filtered_out': 0, 'activities_included': 0,
+            'api_errors': Counter({'400': 0, '403': 0, '404': 0, '500': 0, 'other': 0}),
+            'skipped_objects': deque(maxlen=1000), 'batch_savings': 0
         }
 
     def _create_session_with_retries(self):
         session = requests.Session()
         retry = Retry(total=3, backoff_factor=0.3, status_forcelist=(429, 500, 502, 503, 504),
-                     allowed_methods=["HEAD", "GET", "POST", "OPTIONS"])
-        adapter = HTTPAdapter(max_retries=retry, pool_connections=20, pool_maxsize=20)
+                     allowed_methods=["HEAD", "GET", "POST", "OPTIONS"], respect_retry_after_header=True)
+        # Account, prefetch and ?ids= chunk threads all share this pool; block rather than open
+        # throwaway connections past pool_maxsize that get discarded instead of kept alive
+        adapter = HTTPAdapter(max_retries=retry, pool_connections=self.max_workers * 2,
+                              pool_maxsize=self.max_workers * 4, pool_block=True)
         session.mount("https://", adapter)
         session.mount("http://", adapter)
         return session
 
-    def _is_valid_meta_id(self, obj_id):
-        """Validate Meta ID"""
-        if not obj_id:
+    @staticmethod
+    def _is_valid_meta_id(obj_id):
+        """Validate Meta ID - Graph returns ids as plain digit strings; anything else can't be joined into ?ids="""
+        if not isinstance(obj_id, str):
             return False
-        obj_id = str(obj_id).strip()
-        return 10 <= len(obj_id) <= 25 and obj_id.isdigit()
+        return 10 <= len(obj_id) <= 25 and obj_id.isascii() and obj_id.isdigit()
 
-    def _make_api_request(self, url, params=None, headers=None, timeout=15, retries=2):
-        """Enhanced API request"""
-        for attempt in range(retries + 1):
-            try:
-                r = self.session.get(url, params=params, headers=headers, timeout=timeout)
-                
-                if r.status_code in [400, 403, 404]:
+    def _rate_limiter_for(self, url):
+        return self.rate_limiters.get(urlparse(url).netloc)
+
+    def _make_api_request(self, url, params=None, headers=None, timeout=15):
+        """Enhanced API request - transient 429/5xx and connection errors are retried by the session's Retry"""
+        limiter = self._rate_limiter_for(url)
+        try:
+            if limiter:
+                limiter.acquire()
+            r = self.session.get(url, params=params, headers=headers, timeout=timeout)
+            
+            if r.status_code == 429 and limiter:
+                limiter.throttle()
+            if r.status_code in [400, 403, 404]:
+                with self.state_lock:
                     self.debug_stats['api_errors'][str(r.status_code)] += 1
-                    return None
-                elif r.status_code >= 500:
-                    if attempt < retries:
-                        time.sleep(0.5 * (attempt + 1))
-                        continue
+                return None
+            elif r.status_code >= 500:
+                with self.state_lock:
                     self.debug_stats['api_errors']['500'] += 1
-                    return None
-                
-                r.raise_for_status()
-                return r.json()
-            except Exception:
-                if attempt < retries:
-                    continue
                 return None
-        return None
+            
+            r.raise_for_status()
+            return orjson.loads(r.content)
+        except requests.exceptions.RetryError as e:
+            # The adapter's Retry gave up on repeated 429/5xx responses, so those never reach the status checks above
+            key = '500' if re.search(r'too many 5\d\d error responses', str(e)) else 'other'
+            with self.state_lock:
+                self.debug_stats['api_errors'][key] += 1
+            if limiter:
+                limiter.throttle()
+            return None
+        except Exception:
+            return None
 
     def _batch_api_request(self, requests_list):
         """
@@ -128,14 +233,16 @@ class UltraFastMetaActivityTracker:
                 })
             
             url = f"{self.meta_base_url}/"
-            params = {'access_token': self.meta_access_token, 'batch': json.dumps(batch_payload)}
+            params = {'access_token': self.meta_access_token, 'batch': orjson.dumps(batch_payload).decode()}
             
-            self.debug_stats['api_calls']['batch'] += 1
+            with self.state_lock:
+                self.debug_stats['api_calls']['batch'] += 1
             
             try:
+                self.rate_limiters['graph.facebook.com'].acquire()
                 response = self.session.post(url, params=params, timeout=30)
                 response.raise_for_status()
-                batch_results = response.json()
+                batch_results = orjson.loads(response.content)
                 
                 for idx, result in enumerate(batch_results):
                     original_idx = i + idx
@@ -146,15 +253,13 @@ class UltraFastMetaActivityTracker:
                     
                     if result.get('code') == 200:
                         try:
-                            body = json.loads(result['body'])
+                            body = orjson.loads(result['body'])
                             results[obj_id] = body
                         except:
                             results[obj_id] = None
                     else:
                         results[obj_id] = None
                 
-                time.sleep(0.1)  # Small delay between batch chunks
-                
             except Exception as e:
                 if self.debug_mode:
                     print(f"⚠️ Batch request failed: {e}")
@@ -164,60 +269,124 @@ class UltraFastMetaActivityTracker:
         
         return results
 
-    def _is_human_activity(self, activity):
-        """Permissive filtering"""
-        event_type = activity.get('event_type', '').lower()
+    def get_objects_bulk(self, ids, fields):
+        """
+        Fetch many objects with Graph's ?ids= form - UP TO 50 ids per GET
+        Returns {id: obj}; objects come back parsed, no per-item JSON body to decode
+        """
+        ids = list(ids)
+        chunk_size = 50
+        chunks = [ids[i:i+chunk_size] for i in range(0, len(ids), chunk_size)]
+        if len(chunks) <= 1:
+            return self._fetch_ids_chunk(chunks[0], fields) if chunks else {}
         
-        if event_type in self.EXCLUDED_EVENT_TYPES:
-            self.debug_stats['activities_filtered_out'] += 1
-            return False
+        # Chunks are independent, so overlap them; the graph rate limiter still paces the calls
+        results = {}
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(chunks))) as executor:
+            for chunk_results in executor.map(lambda chunk: self._fetch_ids_chunk(chunk, fields), chunks):
+                results.update(chunk_results)
+        return results
+
+    def _fetch_ids_chunk(self, chunk, fields):
+        """Fetch one chunk of up to 50 ids, falling back to the batch API on failure"""
+        url = f"{self.meta_base_url}/"
+        params = {'access_token': self.meta_access_token, 'ids': ','.join(chunk), 'fields': fields}
         
-        actor = activity.get('actor_name', '').lower()
-        if actor in ['meta', 'facebook', 'system', 'automated', '']:
-            self.debug_stats['activities_filtered_out'] += 1
-            return False
+        with self.state_lock:
+            self.debug_stats['api_calls']['batch'] += 1
+        data = self._make_api_request(url, params, timeout=30)
         
-        self.debug_stats['activities_included'] += 1
-        return True
+        if data is None:
+            # A single deleted/inaccessible id fails the whole ?ids= call,
+            # so retry this chunk via the batch API which isolates per-object errors
+            data = self._batch_api_request(
+                [{'id': oid, 'relative_url': f"{oid}?fields={fields}"} for oid in chunk])
+        
+        return {oid: data.get(oid) for oid in chunk}
+
+    def _is_human_activity(self, activity):
+        """Permissive filtering - two set lookups, actor only checked if the event passes"""
+        return not ((activity.get('event_type') or '').lower() in self.EXCLUDED_EVENT_TYPES or
+                    (activity.get('actor_name') or '').lower() in self.AUTOMATED_ACTORS)
 
     def _normalize_brand_name(self, name):
         """Normalize brand name"""
         if pd.isna(name) or not name:
             return ''
-        
-        name = str(name).lower().strip()
-        remove_terms = ['pvt ltd', 'private limited', 'pvt. ltd.', 'private ltd',
-                       'llp', 'opc', 'limited', 'ltd', 'inc', 'corp',
-                       '- current', '- new', '- old', 'domestic', 'export',
-                       'the ', 'a ', 'an ', 'international', 'india']
-        
-        for term in remove_terms:
+        return self._normalize_brand_text(str(name))
+
+    @staticmethod
+    @lru_cache(maxsize=8192)
+    def _normalize_brand_text(name):
+        """Memoized normalization - the same brand strings repeat across every activity"""
+        name = name.lower().strip()
+        for term in _BRAND_NOISE_TERMS:
             name = name.replace(term, '')
         
         name = ' '.join(name.split())
-        name = ''.join(c for c in name if c.isalnum() or c.isspace())
+        name = _NON_ALNUM_RE.sub('', name)
         return name.strip()
 
+    @staticmethod
+    def _normalize_brand_series(names):
+        """Vectorized _normalize_brand_text for a whole column of brand names"""
+        names = names.str.lower().str.strip()
+        for term in _BRAND_NOISE_TERMS:
+            names = names.str.replace(term, '', regex=False)
+        
+        names = names.str.split().str.join(' ')
+        names = names.str.replace(_NON_ALNUM_RE, '', regex=True)
+        return names.str.strip()
+
     def _find_best_brand_match(self, brand_name):
         """Fuzzy brand matching"""
         if not brand_name:
             return None
         
+        if brand_name in self.brand_match_cache:
+            return self.brand_match_cache[brand_name]
+        
         normalized_input = self._normalize_brand_name(brand_name)
-        if normalized_input in self.brand_mapping_dict:
-            return self.brand_mapping_dict[normalized_input]
+        match = self.brand_mapping_dict.get(normalized_input)
         
-        for norm_brand, data in self.brand_mapping_dict.items():
-            if (normalized_input in norm_brand or norm_brand in normalized_input):
-                if len(normalized_input) >= 5 and len(norm_brand) >= 5:
-                    return data
+        if match is None and len(normalized_input) >= 5:
+            match = self._find_substring_brand_match(normalized_input)
+        
+        self.brand_match_cache[brand_name] = match
+        return match
+
+    def _build_brand_substring_index(self):
+        """Index fuzzy_brand_keys by 5-char windows so substring matching only checks likely keys"""
+        self.brand_gram_index = defaultdict(set)
+        self.brand_prefix_index = defaultdict(list)
+        for pos, key in enumerate(self.fuzzy_brand_keys):
+            self.brand_prefix_index[key[:5]].append(pos)
+            for i in range(len(key) - 4):
+                self.brand_gram_index[key[i:i+5]].add(pos)
+
+    def _find_substring_brand_match(self, query):
+        """
+        First key in fuzzy_brand_keys order that contains query or is contained in it.
+        A key containing query has every 5-char window of it; a key inside query starts with one of them.
+        """
+        windows = {query[i:i+5] for i in range(len(query) - 4)}
+        
+        gram_sets = [self.brand_gram_index.get(w) for w in windows]
+        candidates = set.intersection(*sorted(gram_sets, key=len)) if all(gram_sets) else set()
+        for w in windows:
+            candidates.update(self.brand_prefix_index.get(w, ()))
+        
+        for pos in sorted(candidates):
+            key = self.fuzzy_brand_keys[pos]
+            if query in key or key in query:
+                return self.brand_mapping_dict[key]
         return None
 
-    def fetch_airtable_data(self):
-        """Fetch Airtable brand data"""
-        print("\n" + "="*80)
-        print("FETCHING AIRTABLE BRAND DATA")
-        print("="*80)
+    def fetch_airtable_data(self, log=print):
+        """Fetch Airtable brand data; `log` receives the progress lines (print by default)"""
+        log("\n" + "="*80)
+        log("FETCHING AIRTABLE BRAND DATA")
+        log("="*80)
         
         headers = {'Authorization': f'Bearer {self.airtable_token}'}
         all_records = []
@@ -230,15 +399,14 @@ class UltraFastMetaActivityTracker:
             all_records.extend(response.get('records', []))
             offset = response.get('offset')
             url = f"{self.airtable_url}?offset={offset}" if offset else None
-            time.sleep(0.1)
         
         if not all_records:
-            print("❌ No Airtable records")
+            log("❌ No Airtable records")
             return pd.DataFrame()
         
         df = pd.DataFrame([r.get('fields', {}) for r in all_records])
         df.columns = df.columns.str.strip()
-        print(f"✅ Fetched {len(df)} brands")
+        log(f"✅ Fetched {len(df)} brands")
         return df
 
     def get_all_ad_accounts(self):
@@ -246,7 +414,7 @@ class UltraFastMetaActivityTracker:
         url = f"{self.meta_base_url}/me/adaccounts"
         params = {'access_token': self.meta_access_token,
                  'fields': 'id,name,account_status,business_name,currency,timezone_name',
-                 'limit': 100}
+                 'limit': 500}
         
         accounts = []
         while True:
@@ -258,7 +426,6 @@ class UltraFastMetaActivityTracker:
             if not next_url:
                 break
             url, params = next_url, {}
-            time.sleep(0.05)
         
         self.debug_stats['accounts_total'] = len(accounts)
         
@@ -284,85 +451,141 @@ class UltraFastMetaActivityTracker:
         
         return active
 
-    def get_account_activities(self, ad_account_id, hours=24):
-        """Get human activities from account"""
+    def iter_account_activity_pages(self, ad_account_id, hours=24):
+        """Yield each page of human activities from account as soon as it arrives"""
         since = (datetime.now() - timedelta(hours=hours)).strftime('%Y-%m-%dT%H:%M:%S')
         url = f"{self.meta_base_url}/{ad_account_id}/activities"
         params = {'access_token': self.meta_access_token, 'since': since, 'limit': 500,
                  'fields': 'event_type,event_time,actor_name,object_name,object_type,object_id,translated_event_type,extra_data'}
         
-        activities = []
         while True:
             data = self._make_api_request(url, params)
             if not data or 'data' not in data:
                 break
-            activities.extend([a for a in data.get('data', []) if self._is_human_activity(a)])
+            page = data.get('data', [])
+            human = [a for a in page if self._is_human_activity(a)]
+            # One locked update per page rather than per activity
+            with self.state_lock:
+                self.debug_stats['activities_included'] += len(human)
+                self.debug_stats['activities_filtered_out'] += len(page) - len(human)
+            yield human
             next_url = data.get('paging', {}).get('next')
             if not next_url:
                 break
             url, params = next_url, {}
-            time.sleep(0.03)
-        return activities
 
-    def batch_fetch_campaigns(self, campaign_ids):
+    def batch_fetch_campaigns(self, campaign_ids, use_disk_cache=False):
         """Batch fetch multiple campaigns in ONE API call"""
-        campaign_ids = [cid for cid in campaign_ids if self._is_valid_meta_id(cid) and cid not in self.campaign_cache]
-        
-        if not campaign_ids:
-            return
-        
         fields = 'id,name,status,effective_status,objective,daily_budget,lifetime_budget,bid_strategy'
-        requests = [{'id': cid, 'relative_url': f"{cid}?fields={fields}"} for cid in campaign_ids]
-        
-        results = self._batch_api_request(requests)
-        
-        for cid, data in results.items():
-            if data:
-                self.campaign_cache[cid] = data
-                self.debug_stats['api_calls']['campaign'] += 1
-        
-        if self.debug_mode:
-            print(f"   📦 Batch fetched {len(results)} campaigns")
+        self._batch_fetch_objects('campaign', campaign_ids, self.campaign_cache, fields, use_disk_cache)
 
-    def batch_fetch_adsets(self, adset_ids):
+    def batch_fetch_adsets(self, adset_ids, use_disk_cache=False):
         """Batch fetch multiple adsets in ONE API call"""
-        adset_ids = [aid for aid in adset_ids if self._is_valid_meta_id(aid) and aid not in self.adset_cache]
+        fields = 'id,name,status,effective_status,campaign_id,optimization_goal,billing_event,targeting'
+        self._batch_fetch_objects('adset', adset_ids, self.adset_cache, fields, use_disk_cache)
+
+    def batch_fetch_ads(self, ad_ids, use_disk_cache=False):
+        """Batch fetch multiple ads in ONE API call"""
+        fields = 'id,name,status,effective_status,adset_id,preview_shareable_link'
+        self._batch_fetch_objects('ad', ad_ids, self.ad_cache, fields, use_disk_cache)
+
+    def _batch_fetch_objects(self, kind, ids, cache, fields, use_disk_cache=False):
+        """
+        Fill `cache` for ids not yet fetched from the Graph API
+        The disk cache is only consulted for parent lookups: an object an activity points at was just
+        edited, so a copy from a previous run would show its pre-edit status/budget/name
+        """
+        with self.state_lock:
+            ids = [oid for oid in ids if self._is_valid_meta_id(oid) and self._needs_fetch(kind, oid, cache)]
         
-        if not adset_ids:
+        if not ids:
             return
         
-        fields = 'id,name,status,effective_status,campaign_id,optimization_goal,billing_event,targeting'
-        requests = [{'id': aid, 'relative_url': f"{aid}?fields={fields}"} for aid in adset_ids]
+        fetched_at = time.time()
+        from_disk = self._read_disk_cache(kind, ids) if use_disk_cache else {}
+        with self.state_lock:
+            for oid, data in from_disk.items():
+                self.cache_fetched_at[(kind, oid)] = fetched_at
+                if data:
+                    cache[oid] = data
+        
+        ids = [oid for oid in ids if oid not in from_disk]
+        if not ids:
+            return
+        
+        results = self.get_objects_bulk(ids, fields)
+        fetched_at = time.time()
         
-        results = self._batch_api_request(requests)
+        with self.state_lock:
+            for oid, data in results.items():
+                self.cache_fetched_at[(kind, oid)] = fetched_at
+                if data:
+                    cache[oid] = data
+                    self.debug_stats['api_calls'][kind] += 1
         
-        for aid, data in results.items():
-            if data:
-                self.adset_cache[aid] = data
-                self.debug_stats['api_calls']['adset'] += 1
+        self._write_disk_cache(kind, results, fetched_at)
         
         if self.debug_mode:
-            print(f"   📦 Batch fetched {len(results)} adsets")
+            print(f"   📦 Batch fetched {len(results)} {kind}s ({len(from_disk)} from disk cache)")
 
-    def batch_fetch_ads(self, ad_ids):
-        """Batch fetch multiple ads in ONE API call"""
-        ad_ids = [aid for aid in ad_ids if self._is_valid_meta_id(aid) and aid not in self.ad_cache]
+    def _open_disk_cache(self, path):
+        """SQLite store of fetched objects so consecutive runs skip unchanged metadata; None if unusable"""
+        conn = None
+        try:
+            conn = sqlite3.connect(path, check_same_thread=False)
+            conn.execute('CREATE TABLE IF NOT EXISTS meta_objects ('
+                         'kind TEXT, id TEXT, data BLOB, fetched_at REAL, PRIMARY KEY (kind, id))')
+            conn.execute('DELETE FROM meta_objects WHERE fetched_at < ?', (time.time() - self.DISK_CACHE_TTL,))
+            conn.commit()
+            return conn
+        except sqlite3.Error as e:
+            print(f"⚠️ Disk cache {path} unusable, continuing without it: {e}")
+            if conn is not None:
+                conn.close()
+            return None
+
+    def _read_disk_cache(self, kind, ids):
+        """Return {id: data} for fresh disk entries; data is None for remembered misses"""
+        if self.disk_cache is None:
+            return {}
         
-        if not ad_ids:
+        now = time.time()
+        found = {}
+        with self.disk_cache_lock:
+            try:
+                for i in range(0, len(ids), 500):
+                    chunk = ids[i:i+500]
+                    rows = self.disk_cache.execute(
+                        f"SELECT id, data, fetched_at FROM meta_objects WHERE kind = ? AND id IN ({','.join('?' * len(chunk))})",
+                        [kind, *chunk]).fetchall()
+                    for oid, data, fetched_at in rows:
+                        ttl = self.DISK_CACHE_TTL if data is not None else self.DISK_MISSING_TTL
+                        if now - fetched_at <= ttl:
+                            found[oid] = orjson.loads(data) if data is not None else None
+            except sqlite3.Error as e:
+                print(f"⚠️ Disk cache read failed, fetching from API: {e}")
+                return {}
+        return found
+
+    def _write_disk_cache(self, kind, results, fetched_at):
+        if self.disk_cache is None:
             return
         
-        fields = 'id,name,status,effective_status,adset_id,preview_shareable_link'
-        requests = [{'id': aid, 'relative_url': f"{aid}?fields={fields}"} for aid in ad_ids]
-        
-        results = self._batch_api_request(requests)
-        
-        for aid, data in results.items():
-            if data:
-                self.ad_cache[aid] = data
-                self.debug_stats['api_calls']['ad'] += 1
-        
-        if self.debug_mode:
-            print(f"   📦 Batch fetched {len(results)} ads")
+        rows = [(kind, oid, orjson.dumps(data) if data else None, fetched_at) for oid, data in results.items()]
+        with self.disk_cache_lock:
+            try:
+                self.disk_cache.executemany('INSERT OR REPLACE INTO meta_objects VALUES (?, ?, ?, ?)', rows)
+                self.disk_cache.commit()
+            except sqlite3.Error as e:
+                print(f"⚠️ Disk cache write failed: {e}")
+
+    def _needs_fetch(self, kind, obj_id, cache):
+        """True if obj_id was never fetched or its cached result/miss has expired"""
+        fetched_at = self.cache_fetched_at.get((kind, obj_id))
+        if fetched_at is None:
+            return True
+        ttl = self.OBJECT_CACHE_TTL if obj_id in cache else self.MISSING_OBJECT_TTL
+        return time.time() - fetched_at > ttl
 
     def get_campaign_details(self, cid):
         """Get campaign with caching"""
@@ -437,111 +660,156 @@ class UltraFastMetaActivityTracker:
         
         return campaign_ids, adset_ids, ad_ids
 
-    def _build_complete_hierarchy(self, activity):
-        """Build hierarchy using CACHED data (no API calls here!)"""
-        obj_id = activity.get('object_id', '')
-        obj_type = activity.get('object_type', '').lower()
-        obj_name = activity.get('object_name', '')
-        
-        self.debug_stats['object_types_found'][obj_type] = self.debug_stats['object_types_found'].get(obj_type, 0) + 1
-        
-        h = {'Campaign_Name': 'N/A', 'Campaign_Status': 'N/A', 'Campaign_Objective': 'N/A',
-             'Campaign_Budget_Type': 'N/A', 'Campaign_Budget': 'N/A', 'Campaign_Bid_Strategy': 'N/A',
-             'AdSet_Name': 'N/A', 'AdSet_Status': 'N/A', 'AdSet_Optimization_Goal': 'N/A',
-             'AdSet_Billing_Event': 'N/A', 'Age_Targeting': 'N/A', 'Gender_Targeting': 'N/A',
-             'Location_Targeting': 'N/A', 'Ad_Name': 'N/A', 'Ad_Status': 'N/A',
-             'Ad_Preview_Link': 'N/A', 'Hierarchy_Level': 'UNKNOWN'}
-        
-        try:
-            if obj_type == 'campaign_group':
-                h['Hierarchy_Level'] = 'CAMPAIGN'
-                data = self.get_campaign_details(obj_id)
-                if data:
-                    h['Campaign_Name'] = data.get('name', obj_name)
-                    h['Campaign_Status'] = data.get('effective_status', 'N/A')
-                    h['Campaign_Objective'] = data.get('objective', 'N/A')
-                    h['Campaign_Bid_Strategy'] = data.get('bid_strategy', 'N/A')
-                    
-                    if data.get('daily_budget'):
-                        h['Campaign_Budget_Type'] = 'Daily'
-                        h['Campaign_Budget'] = f"${float(data['daily_budget'])/100:.2f}"
-                    elif data.get('lifetime_budget'):
-                        h['Campaign_Budget_Type'] = 'Lifetime'
-                        h['Campaign_Budget'] = f"${float(data['lifetime_budget'])/100:.2f}"
-                    self.debug_stats['hierarchy_built']['campaign_group'] += 1
+    def _prefetch_full_chunks(self, activities, pending, queued, executor):
+        """
+        Queue a bulk fetch for every full 50-id chunk seen so far, so hierarchy
+        objects download while other accounts are still paginating
+        """
+        fetchers = {'campaign': self.batch_fetch_campaigns, 'adset': self.batch_fetch_adsets,
+                    'ad': self.batch_fetch_ads}
+        futures = []
+        
+        for kind, ids in zip(('campaign', 'adset', 'ad'), self._collect_ids_from_activities(activities)):
+            pending[kind].update(ids - queued[kind])
+            while len(pending[kind]) >= 50:
+                chunk = [pending[kind].pop() for _ in range(50)]
+                queued[kind].update(chunk)
+                futures.append(executor.submit(fetchers[kind], chunk))
+        
+        return futures
+
+    @staticmethod
+    def _parse_event_times(times):
+        """Parse all event_time values in one pass; unparseable values become NaT"""
+        stripped = times.str.split('+').str[0].str.replace('Z', '', regex=False)
+        return pd.to_datetime(stripped, format='%Y-%m-%dT%H:%M:%S', errors='coerce')
+
+    @staticmethod
+    def _fmt_budget(budget):
+        """Format a budget given in minor units (cents); integral values use exact integer math"""
+        if isinstance(budget, str) and budget.lstrip('-').isdigit():
+            cents = int(budget)
+        elif isinstance(budget, int):
+            cents = budget
+        else:
+            # Fractional or otherwise unusual input keeps the original float rounding
+            return f"${float(budget)/100:.2f}"
+        sign = '-' if cents < 0 else ''
+        return f"${sign}{abs(cents) // 100}.{abs(cents) % 100:02d}"
+
+    def _apply_campaign(self, h, data, default_name='N/A'):
+        h['Campaign_Name'] = data.get('name', default_name)
+        h['Campaign_Status'] = data.get('effective_status', 'N/A')
+        h['Campaign_Objective'] = data.get('objective', 'N/A')
+        h['Campaign_Bid_Strategy'] = data.get('bid_strategy', 'N/A')
+        
+        if data.get('daily_budget'):
+            h['Campaign_Budget_Type'] = 'Daily'
+            h['Campaign_Budget'] = self._fmt_budget(data['daily_budget'])
+        elif data.get('lifetime_budget'):
+            h['Campaign_Budget_Type'] = 'Lifetime'
+            h['Campaign_Budget'] = self._fmt_budget(data['lifetime_budget'])
+
+    def _apply_adset(self, h, data, default_name='N/A'):
+        h['AdSet_Name'] = data.get('name', default_name)
+        h['AdSet_Status'] = data.get('effective_status', 'N/A')
+        h['AdSet_Optimization_Goal'] = data.get('optimization_goal', 'N/A')
+        h['AdSet_Billing_Event'] = data.get('billing_event', 'N/A')
+        
+        age, gender, loc = self._extract_targeting_info(data.get('targeting'))
+        h['Age_Targeting'], h['Gender_Targeting'], h['Location_Targeting'] = age, gender, loc
+
+    @staticmethod
+    def _apply_ad(h, data, default_name='N/A'):
+        h['Ad_Name'] = data.get('name', default_name)
+        h['Ad_Status'] = data.get('effective_status', 'N/A')
+        h['Ad_Preview_Link'] = data.get('preview_shareable_link', 'N/A')
+
+    def _apply_parent_campaign(self, h, child):
+        cid = child.get('campaign_id')
+        cdata = self.get_campaign_details(cid) if cid else None
+        if cdata:
+            self._apply_campaign(h, cdata)
+
+    def _build_campaign_hierarchy(self, h, activity):
+        h['Hierarchy_Level'] = 'CAMPAIGN'
+        data = self.get_campaign_details(activity.get('object_id', ''))
+        if data:
+            self._apply_campaign(h, data, activity.get('object_name', ''))
+            self.debug_stats['hierarchy_built']['campaign_group'] += 1
+
+    def _build_adset_hierarchy(self, h, activity):
+        h['Hierarchy_Level'] = 'ADSET'
+        data = self.get_adset_details(activity.get('object_id', ''))
+        if data:
+            self._apply_adset(h, data, activity.get('object_name', ''))
+            self._apply_parent_campaign(h, data)
+            self.debug_stats['hierarchy_built']['campaign'] += 1
+
+    def _build_ad_hierarchy(self, h, activity):
+        h['Hierarchy_Level'] = 'AD'
+        data = self.get_ad_details(activity.get('object_id', ''))
+        if data:
+            self._apply_ad(h, data, activity.get('object_name', ''))
             
-            elif obj_type == 'campaign':
-                h['Hierarchy_Level'] = 'ADSET'
-                data = self.get_adset_details(obj_id)
-                if data:
-                    h['AdSet_Name'] = data.get('name', obj_name)
-                    h['AdSet_Status'] = data.get('effective_status', 'N/A')
-                    h['AdSet_Optimization_Goal'] = data.get('optimization_goal', 'N/A')
-                    h['AdSet_Billing_Event'] = data.get('billing_event', 'N/A')
-                    
-                    age, gender, loc = self._extract_targeting_info(data.get('targeting'))
-                    h['Age_Targeting'], h['Gender_Targeting'], h['Location_Targeting'] = age, gender, loc
-                    
-                    cid = data.get('campaign_id')
-                    if cid:
-                        cdata = self.get_campaign_details(cid)
-                        if cdata:
-                            h['Campaign_Name'] = cdata.get('name', 'N/A')
-                            h['Campaign_Status'] = cdata.get('effective_status', 'N/A')
-                            h['Campaign_Objective'] = cdata.get('objective', 'N/A')
-                            h['Campaign_Bid_Strategy'] = cdata.get('bid_strategy', 'N/A')
-                            
-                            if cdata.get('daily_budget'):
-                                h['Campaign_Budget_Type'] = 'Daily'
-                                h['Campaign_Budget'] = f"${float(cdata['daily_budget'])/100:.2f}"
-                            elif cdata.get('lifetime_budget'):
-                                h['Campaign_Budget_Type'] = 'Lifetime'
-                                h['Campaign_Budget'] = f"${float(cdata['lifetime_budget'])/100:.2f}"
-                    self.debug_stats['hierarchy_built']['campaign'] += 1
+            aid = data.get('adset_id')
+            adata = self.get_adset_details(aid) if aid else None
+            if adata:
+                self._apply_adset(h, adata)
+                self._apply_parent_campaign(h, adata)
+            self.debug_stats['hierarchy_built']['adgroup'] += 1
+
+    def _build_hierarchies(self, activities):
+        """
+        Build hierarchies using CACHED data (no API calls here!)
+        Activities are grouped by object type so each group runs one builder, results keep input order.
+        An object edited many times is built once; its rows share that (read-only) hierarchy dict
+        """
+        builders = {'campaign_group': self._build_campaign_hierarchy,
+                    'campaign': self._build_adset_hierarchy,
+                    'adgroup': self._build_ad_hierarchy}
+        groups = defaultdict(list)
+        for i, act in enumerate(activities):
+            groups[act.get('object_type', '').lower()].append(i)
+        
+        hierarchies = [None] * len(activities)
+        found = self.debug_stats['object_types_found']
+        built = self.debug_stats['hierarchy_built']
+        cache_hits = self.debug_stats['cache_hits']
+        
+        for obj_type, indexes in groups.items():
+            found[obj_type] += len(indexes)
+            builder = builders.get(obj_type)
             
-            elif obj_type == 'adgroup':
-                h['Hierarchy_Level'] = 'AD'
-                data = self.get_ad_details(obj_id)
-                if data:
-                    h['Ad_Name'] = data.get('name', obj_name)
-                    h['Ad_Status'] = data.get('effective_status', 'N/A')
-                    h['Ad_Preview_Link'] = data.get('preview_shareable_link', 'N/A')
-                    
-                    aid = data.get('adset_id')
-                    if aid:
-                        adata = self.get_adset_details(aid)
-                        if adata:
-                            h['AdSet_Name'] = adata.get('name', 'N/A')
-                            h['AdSet_Status'] = adata.get('effective_status', 'N/A')
-                            h['AdSet_Optimization_Goal'] = adata.get('optimization_goal', 'N/A')
-                            h['AdSet_Billing_Event'] = adata.get('billing_event', 'N/A')
-                            
-                            age, gender, loc = self._extract_targeting_info(adata.get('targeting'))
-                            h['Age_Targeting'], h['Gender_Targeting'], h['Location_Targeting'] = age, gender, loc
-                            
-                            cid = adata.get('campaign_id')
-                            if cid:
-                                cdata = self.get_campaign_details(cid)
-                                if cdata:
-                                    h['Campaign_Name'] = cdata.get('name', 'N/A')
-                                    h['Campaign_Status'] = cdata.get('effective_status', 'N/A')
-                                    h['Campaign_Objective'] = cdata.get('objective', 'N/A')
-                                    h['Campaign_Bid_Strategy'] = cdata.get('bid_strategy', 'N/A')
-                                    
-                                    if cdata.get('daily_budget'):
-                                        h['Campaign_Budget_Type'] = 'Daily'
-                                        h['Campaign_Budget'] = f"${float(cdata['daily_budget'])/100:.2f}"
-                                    elif cdata.get('lifetime_budget'):
-                                        h['Campaign_Budget_Type'] = 'Lifetime'
-                                        h['Campaign_Budget'] = f"${float(cdata['lifetime_budget'])/100:.2f}"
-                    self.debug_stats['hierarchy_built']['adgroup'] += 1
-            else:
-                h['Hierarchy_Level'] = f'OTHER:{obj_type}'
-        
-        except Exception as e:
-            self.debug_stats['hierarchy_errors'].append(f"{obj_type}-{obj_id}:{e}")
-        
-        return h
+            if builder is None:
+                for i in indexes:
+                    h = self.EMPTY_HIERARCHY.copy()
+                    h['Hierarchy_Level'] = f'OTHER:{obj_type}'
+                    hierarchies[i] = h
+                continue
+            
+            # (object_id, object_name) -> (hierarchy, hierarchy_built increment, cache_hits increments);
+            # a memo hit replays both so the stats still count rows rather than distinct objects
+            memo = {}
+            for i in indexes:
+                act = activities[i]
+                key = (act.get('object_id', ''), act.get('object_name', ''))
+                if key in memo:
+                    h, increment, hit_increments = memo[key]
+                    built[obj_type] += increment
+                    cache_hits.update(hit_increments)
+                else:
+                    h = self.EMPTY_HIERARCHY.copy()
+                    before = built[obj_type]
+                    hits_before = cache_hits.copy()
+                    try:
+                        builder(h, act)
+                    except Exception as e:
+                        self.debug_stats['hierarchy_errors'].append(f"{obj_type}-{act.get('object_id', '')}:{e}")
+                    memo[key] = (h, built[obj_type] - before, cache_hits - hits_before)
+                hierarchies[i] = h
+        
+        return hierarchies
 
     def _process_account(self, account, hours=24):
         """Process one account - collect activities only (no hierarchy building yet)"""
@@ -551,12 +819,15 @@ class UltraFastMetaActivityTracker:
         acc_status = account.get('account_status', 'Unknown')
         brand = biz_name if biz_name else acc_name
         
-        activities = self.get_account_activities(acc_id, hours) or []
-        if activities:
-            self.debug_stats['accounts_with_activity'] += 1
+        # Tag each page with account info as it arrives instead of collecting then re-walking
+        rows = []
+        for page in self.iter_account_activity_pages(acc_id, hours):
+            rows.extend((act, brand, acc_id, acc_name, acc_status) for act in page)
+        if rows:
+            with self.state_lock:
+                self.debug_stats['accounts_with_activity'] += 1
         
-        # Return raw activities with account info
-        return [(act, brand, acc_id, acc_name, acc_status) for act in activities]
+        return rows
 
     def fetch_meta_activities(self, hours=24):
         """
@@ -577,17 +848,42 @@ class UltraFastMetaActivityTracker:
         # STEP 1: Collect all activities from all accounts (parallel)
         print(f"\n📥 STEP 1: Collecting activities from {len(accounts)} accounts...")
         all_raw_activities = []
-        
-        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            futures = {executor.submit(self._process_account, acc, hours): acc for acc in accounts}
+        pending = {'campaign': set(), 'adset': set(), 'ad': set()}
+        queued = {'campaign': set(), 'adset': set(), 'ad': set()}
+        prefetch_futures = []
+        account_errors = []
+        progress_step = max(10, len(accounts) // 10)  # ~10 progress lines however many accounts
+        
+        # Separate small pool so prefetches don't queue behind the remaining accounts
+        with ThreadPoolExecutor(max_workers=2) as prefetcher:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = {executor.submit(self._process_account, acc, hours): acc for acc in accounts}
+                
+                for i, future in enumerate(as_completed(futures), 1):
+                    if i % progress_step == 0:
+                        print(f"  Progress: {i}/{len(accounts)}")
+                    try:
+                        rows = future.result()
+                        all_raw_activities.extend(rows)
+                        prefetch_futures.extend(self._prefetch_full_chunks(
+                            [row[0] for row in rows], pending, queued, prefetcher))
+                    except Exception as e:
+                        account_errors.append(e)
             
-            for i, future in enumerate(as_completed(futures), 1):
-                if i % 10 == 0:
-                    print(f"  Progress: {i}/{len(accounts)}")
+            for future in prefetch_futures:
                 try:
-                    all_raw_activities.extend(future.result())
+                    future.result()
                 except Exception as e:
-                    print(f"⚠️ Error: {e}")
+                    print(f"⚠️ Prefetch error: {e}")
+        
+        # Reported after the loop so the main thread keeps draining completed accounts
+        for e in account_errors[:10]:
+            print(f"⚠️ Error: {e}")
+        if len(account_errors) > 10:
+            print(f"⚠️ ...and {len(account_errors) - 10} more account errors")
+        
+        if prefetch_futures:
+            print(f"  ⚡ Prefetched {len(prefetch_futures)} object chunks while collecting")
         
         if not all_raw_activities:
             print("\n✅ No activities found")
@@ -611,23 +907,27 @@ class UltraFastMetaActivityTracker:
             print(f"  📦 Batch fetching {len(ad_ids)} ads...")
             self.batch_fetch_ads(list(ad_ids))
         
-        if adset_ids:
-            print(f"  📦 Batch fetching {len(adset_ids)} adsets...")
+        # Parent adsets of the ads, deduped so shared adsets are fetched once
+        parent_adset_ids = {self.ad_cache[aid]['adset_id'] for aid in ad_ids
+                            if self.ad_cache.get(aid, {}).get('adset_id')}
+        all_adset_ids = adset_ids.union(parent_adset_ids)
+        
+        if all_adset_ids:
+            print(f"  📦 Batch fetching {len(all_adset_ids)} adsets...")
             self.batch_fetch_adsets(list(adset_ids))
+            self.batch_fetch_adsets(list(parent_adset_ids - adset_ids), use_disk_cache=True)
         
-        # Collect parent campaign IDs from adsets
-        parent_campaign_ids = set()
-        for adset_data in self.adset_cache.values():
-            cid = adset_data.get('campaign_id')
-            if cid:
-                parent_campaign_ids.add(cid)
+        # Collect parent campaign IDs from the adsets we actually need
+        parent_campaign_ids = {self.adset_cache[aid]['campaign_id'] for aid in all_adset_ids
+                               if self.adset_cache.get(aid, {}).get('campaign_id')}
         
         # Combine with direct campaign IDs
         all_campaign_ids = campaign_ids.union(parent_campaign_ids)
         
         if all_campaign_ids:
             print(f"  📦 Batch fetching {len(all_campaign_ids)} campaigns...")
-            self.batch_fetch_campaigns(list(all_campaign_ids))
+            self.batch_fetch_campaigns(list(campaign_ids))
+            self.batch_fetch_campaigns(list(parent_campaign_ids - campaign_ids), use_disk_cache=True)
         
         batch_time = time.time() - start_batch
         print(f"✅ Batch fetching complete in {batch_time:.1f}s")
@@ -635,46 +935,38 @@ class UltraFastMetaActivityTracker:
         # STEP 4: Build hierarchies from cache (super fast, no API calls!)
         print(f"\n🏗️ STEP 4: Building hierarchies from cache...")
         results = []
+        hierarchies = self._build_hierarchies([row[0] for row in all_raw_activities])
         
-        for act, brand, acc_id, acc_name, acc_status in all_raw_activities:
-            h = self._build_complete_hierarchy(act)
-            
+        for (act, brand, acc_id, acc_name, acc_status), h in zip(all_raw_activities, hierarchies):
             extra = act.get('extra_data', {})
             try:
                 if isinstance(extra, str):
-                    extra = json.loads(extra)
+                    extra = orjson.loads(extra)
                 old_val = str(extra.get('old_value', 'N/A'))
                 new_val = str(extra.get('new_value', 'N/A'))
             except:
                 old_val, new_val = 'N/A', 'N/A'
             
-            timestamp = act.get('event_time', '')
-            if timestamp:
-                try:
-                    dt = datetime.strptime(timestamp.split('+')[0].replace('Z', ''), '%Y-%m-%dT%H:%M:%S')
-                    timestamp = dt.strftime('%Y-%m-%d %H:%M:%S')
-                except:
-                    pass
-            
-            results.append({
-                'Brand': brand, 'Account_ID': acc_id, 'Account_Name': acc_name,
-                'Account_Status': acc_status, 'Actor': act.get('actor_name', 'Unknown'),
-                'Action': act.get('translated_event_type', act.get('event_type', 'Unknown')),
-                'Hierarchy_Level': h['Hierarchy_Level'], 'Timestamp': timestamp,
-                **{k: v for k, v in h.items() if k != 'Hierarchy_Level'},
-                'Changed_From': old_val, 'Changed_To': new_val,
-                'Object_Name': act.get('object_name', ''),
-                'Object_ID': act.get('object_id', ''),
-                'Object_Type_Raw': act.get('object_type', ''),
-                'Raw_Event_Type': act.get('event_type', '')
-            })
-        
-        df = pd.DataFrame(results)
-        if 'Timestamp' in df.columns:
-            df = df.sort_values('Timestamp', ascending=False)
+            # Row order must match ACTIVITY_COLUMNS
+            results.append((
+                brand, acc_id, acc_name, acc_status, act.get('actor_name', 'Unknown'),
+                act.get('translated_event_type', act.get('event_type', 'Unknown')),
+                h['Hierarchy_Level'], act.get('event_time', ''),
+                *[h[k] for k in self.HIERARCHY_FIELDS],
+                old_val, new_val,
+                act.get('object_name', ''), act.get('object_id', ''),
+                act.get('object_type', ''), act.get('event_type', '')
+            ))
+        
+        df = pd.DataFrame.from_records(results, columns=self.ACTIVITY_COLUMNS)
+        event_times = self._parse_event_times(df['Timestamp'])
+        df['Timestamp'] = event_times.dt.strftime('%Y-%m-%d %H:%M:%S').fillna(df['Timestamp'])  # Unparseable kept as-is
+        # Order on the datetime64 values, not on the formatted strings
+        df = df.loc[event_times.sort_values(ascending=False, kind='mergesort').index]
         
         # Calculate batch savings
-        individual_calls = len(campaign_ids) + len(adset_ids) + len(ad_ids) + len(parent_campaign_ids)
+        individual_calls = (len(campaign_ids) + len(adset_ids) + len(ad_ids) +
+                            len(parent_adset_ids) + len(parent_campaign_ids))
         batch_calls = self.debug_stats['api_calls']['batch']
         savings = individual_calls - batch_calls
         self.debug_stats['batch_savings'] = savings
@@ -707,45 +999,64 @@ class UltraFastMetaActivityTracker:
             print("❌ No Brand column")
             return df
         
-        for _, row in self.brand_mapping_df.iterrows():
-            bn = str(row[brand_col]).strip() if pd.notna(row[brand_col]) else ''
-            if bn:
-                norm = self._normalize_brand_name(bn)
-                if norm:
-                    self.brand_mapping_dict[norm] = {
-                        'original_name': bn,
-                        'FB_Manager': row[fb_col] if fb_col and pd.notna(row[fb_col]) else 'Not Assigned',
-                        'Brand_Manager': row[bm_col] if bm_col and pd.notna(row[bm_col]) else 'Not Assigned',
-                        'Current_Team': row[team_col] if team_col and pd.notna(row[team_col]) else 'Not Assigned'
-                    }
-        
-        def map_brand(brand):
+        mapping_df = self.brand_mapping_df
+        
+        def assigned(col):
+            if not col:
+                return pd.Series('Not Assigned', index=mapping_df.index)
+            return mapping_df[col].astype(object).where(mapping_df[col].notna(), 'Not Assigned')
+        
+        brands = mapping_df[brand_col]
+        originals = brands.where(brands.notna(), '').astype(str).str.strip()
+        normalized = self._normalize_brand_series(originals)
+        
+        for norm, bn, fb, bm, team in zip(normalized, originals, assigned(fb_col),
+                                          assigned(bm_col), assigned(team_col)):
+            if bn and norm:
+                self.brand_mapping_dict[norm] = {
+                    'original_name': bn,
+                    'FB_Manager': fb,
+                    'Brand_Manager': bm,
+                    'Current_Team': team
+                }
+        
+        self.fuzzy_brand_keys = [b for b in self.brand_mapping_dict if len(b) >= 5]
+        self._build_brand_substring_index()
+        self.brand_match_cache = {}
+        
+        # Match each distinct brand once, then broadcast the rows back with take()
+        codes, brands = pd.factorize(df['Brand'])
+        brand_rows = []
+        for brand in brands:
             match = self._find_best_brand_match(brand)
-            if match:
-                return pd.Series({'Matched_Airtable_Brand': match['original_name'],
-                                'FB_Manager': match['FB_Manager'],
-                                'Brand_Manager': match['Brand_Manager'],
-                                'Current_Team': match['Current_Team']})
-            return pd.Series({'Matched_Airtable_Brand': '', 'FB_Manager': 'Unknown',
-                            'Brand_Manager': 'Unknown', 'Current_Team': 'Unknown'})
-        
-        mapping = df['Brand'].apply(map_brand)
-        df = pd.concat([df, mapping], axis=1)
+            brand_rows.append((match['original_name'], match['FB_Manager'],
+                               match['Brand_Manager'], match['Current_Team']) if match
+                              else ('', 'Unknown', 'Unknown', 'Unknown'))
+        brand_rows.append(('', 'Unknown', 'Unknown', 'Unknown'))  # Missing brands get code -1, i.e. this last row
+        
+        mapped_cols = ('Matched_Airtable_Brand', 'FB_Manager', 'Brand_Manager', 'Current_Team')
+        for col, values in zip(mapped_cols, zip(*brand_rows)):
+            df[col] = pd.Series(values, dtype=object).to_numpy()[codes]
         df['Fetch_Date'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         
-        mapped = df[df['FB_Manager'] != 'Unknown'].shape[0]
+        mapped = int(df['FB_Manager'].ne('Unknown').sum())
         print(f"✅ Mapped: {mapped}/{len(df)} ({mapped/len(df)*100:.1f}%)")
         
-        col_order = ['Brand', 'Matched_Airtable_Brand', 'FB_Manager', 'Brand_Manager', 'Current_Team',
-                    'Actor', 'Action', 'Hierarchy_Level', 'Timestamp',
-                    'Campaign_Name', 'Campaign_Status', 'Campaign_Objective', 'Campaign_Budget_Type',
-                    'Campaign_Budget', 'Campaign_Bid_Strategy', 'AdSet_Name', 'AdSet_Status',
-                    'AdSet_Optimization_Goal', 'AdSet_Billing_Event', 'Age_Targeting', 'Gender_Targeting',
-                    'Location_Targeting', 'Ad_Name', 'Ad_Status', 'Ad_Preview_Link',
-                    'Changed_From', 'Changed_To', 'Account_ID', 'Account_Name', 'Account_Status',
-                    'Object_Name', 'Object_ID', 'Object_Type_Raw', 'Raw_Event_Type', 'Fetch_Date']
-        
-        return df[[c for c in col_order if c in df.columns]]
+        return df[list(self.OUTPUT_COLUMNS)]
+
+    @staticmethod
+    def _distinct_count(series):
+        """Distinct values; a freshly categorized column already knows them"""
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            return len(series.cat.categories)
+        return series.nunique()
+
+    def _categorize_repeated_columns(self, df):
+        """Store repeated string columns as category codes for cheaper hashing in dedup and counts"""
+        for col in self.CATEGORY_COLUMNS:
+            if col in df.columns:
+                df[col] = df[col].astype('category')
+        return df
 
     def setup_google_sheets(self):
         """Setup Google Sheets"""
@@ -760,31 +1071,64 @@ class UltraFastMetaActivityTracker:
             print(f"⚠️ Google Sheets setup failed: {e}")
             return None
 
+    def _get_spreadsheet(self):
+        if self.spreadsheet is None:
+            self.spreadsheet = self.gspread_client.open_by_key(self.google_spreadsheet_id)
+        return self.spreadsheet
+
+    def _get_worksheet(self, name):
+        """Worksheet handle, looked up only once per run"""
+        if name not in self.worksheet_cache:
+            self.worksheet_cache[name] = self._get_spreadsheet().worksheet(name)
+        return self.worksheet_cache[name]
+
+    def _style_header_row(self, ws):
+        """Bold green header plus frozen first row, sent as one batchUpdate"""
+        self._get_spreadsheet().batch_update({'requests': [
+            {'repeatCell': {
+                'range': {'sheetId': ws.id, 'startRowIndex': 0, 'endRowIndex': 1},
+                'cell': {'userEnteredFormat': {'textFormat': {'bold': True},
+                                               'backgroundColor': {'red': 0.2, 'green': 0.6, 'blue': 0.2}}},
+                'fields': 'userEnteredFormat(textFormat,backgroundColor)'}},
+            {'updateSheetProperties': {
+                'properties': {'sheetId': ws.id, 'gridProperties': {'frozenRowCount': 1}},
+                'fields': 'gridProperties.frozenRowCount'}}
+        ]})
+
+    def _add_worksheet(self, name, rows, cols):
+        self.worksheet_cache[name] = self._get_spreadsheet().add_worksheet(title=name, rows=rows, cols=cols)
+        return self.worksheet_cache[name]
+
     def get_last_entry_time_from_sheet(self):
         """Get last timestamp from sheet"""
         if not self.gspread_client:
             return None
         try:
-            sh = self.gspread_client.open_by_key(self.google_spreadsheet_id)
-            ws = sh.worksheet('Meta_Activities_Log')
-            data = ws.get_all_records()
-            if not data:
-                return None
+            ws = self._get_worksheet('Meta_Activities_Log')
             
-            df = pd.DataFrame(data)
-            if 'Timestamp' not in df.columns:
+            # Only the Timestamp column is needed, so skip downloading the whole sheet
+            header = ws.row_values(1)
+            if 'Timestamp' not in header:
                 return None
             
-            df = df[df['Timestamp'].notna() & (df['Timestamp'] != '')]
-            if df.empty:
+            timestamps = pd.Series(ws.col_values(header.index('Timestamp') + 1)[1:], dtype=object)
+            timestamps = timestamps[timestamps != '']
+            if timestamps.empty:
                 return None
             
-            df['Timestamp_dt'] = pd.to_datetime(df['Timestamp'], errors='coerce')
-            df = df.dropna(subset=['Timestamp_dt'])
-            if df.empty:
-                return None
+            # Our own '%Y-%m-%d %H:%M:%S' strings sort chronologically, so only the winner needs parsing
+            iso = timestamps[timestamps.str.fullmatch(_SHEET_TIMESTAMP_RE)]
+            last = pd.to_datetime(iso.max(), format='%Y-%m-%d %H:%M:%S', errors='coerce') if not iso.empty else pd.NaT
+            
+            if pd.isna(last):
+                parsed = pd.to_datetime(timestamps, format='%Y-%m-%d %H:%M:%S', errors='coerce', cache=True).dropna()
+                if parsed.empty:
+                    # Column was reformatted in the sheet UI, let pandas infer the format
+                    parsed = pd.to_datetime(timestamps, errors='coerce').dropna()
+                if parsed.empty:
+                    return None
+                last = parsed.max()
             
-            last = df['Timestamp_dt'].max()
             print(f"📅 Last entry: {last}")
             return last
         except Exception as e:
@@ -796,29 +1140,70 @@ class UltraFastMetaActivityTracker:
         if not self.gspread_client:
             return pd.DataFrame()
         try:
-            sh = self.gspread_client.open_by_key(self.google_spreadsheet_id)
-            ws = sh.worksheet(sheet)
-            data = ws.get_all_records()
-            if data:
-                df = pd.DataFrame(data)
+            ws = self._get_worksheet(sheet)
+            values = ws.get_all_values()
+            if len(values) > 1:
+                df = pd.DataFrame(values[1:], columns=values[0])
                 print(f"📊 Existing: {len(df)} rows")
                 return df
             return pd.DataFrame()
         except:
             return pd.DataFrame()
 
+    def read_existing_keys_from_sheets(self, header, sheet='Meta_Activities_Log'):
+        """
+        Read only the DEDUP_KEY_COLUMNS of the sheet in one request, assuming its header row is `header`
+        Returns None when the sheet's header differs (or can't be read) so the caller falls back to a full read
+        """
+        if not self.gspread_client or any(col not in header for col in self.DEDUP_KEY_COLUMNS):
+            return None
+        try:
+            letters = [re.sub(r'\d', '', rowcol_to_a1(1, header.index(col) + 1)) for col in self.DEDUP_KEY_COLUMNS]
+            ranges = [absolute_range_name(sheet, '1:1')] + [absolute_range_name(sheet, f'{l}2:{l}') for l in letters]
+            value_ranges = self._get_spreadsheet().values_batch_get(ranges).get('valueRanges', [])
+            
+            # The column letters were guessed from `header`, so they only hold if the sheet agrees
+            sheet_header = (value_ranges[0].get('values') or [[]])[0] if value_ranges else []
+            if sheet_header != list(header):
+                return None
+            
+            columns = [[row[0] if row else '' for row in vr.get('values', [])] for vr in value_ranges[1:]]
+            n_rows = max(map(len, columns), default=0)
+            if n_rows:
+                print(f"📊 Existing: {n_rows} rows (key columns only)")
+            return pd.DataFrame({col: values + [''] * (n_rows - len(values))
+                                 for col, values in zip(self.DEDUP_KEY_COLUMNS, columns)})
+        except Exception:
+            return None
+
     def log_github_activity(self, action, details):
-        """Log activities to GitHub Actions Log sheet"""
+        """Queue a row for the GitHub Actions Log sheet; flush_github_logs() writes them"""
         if self.gspread_client is None:
             return
         
+        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        run_number = os.getenv('GITHUB_RUN_NUMBER', 'manual')
+        
+        self.pending_logs.append([
+            timestamp,
+            run_number,
+            action,
+            details,
+            '',
+            '',
+            '✅ Success' if 'Success' in action or 'Completed' in action else '🔄 In Progress'
+        ])
+
+    def flush_github_logs(self):
+        """Write all queued log rows to the GitHub Actions Log sheet in one request"""
+        if self.gspread_client is None or not self.pending_logs:
+            return
+        
         try:
-            sh = self.gspread_client.open_by_key(self.google_spreadsheet_id)
-            
             try:
-                ws = sh.worksheet('GitHub_Actions_Log')
-            except:
-                ws = sh.add_worksheet(title='GitHub_Actions_Log', rows=1000, cols=10)
+                ws = self._get_worksheet('GitHub_Actions_Log')
+            except gspread.exceptions.WorksheetNotFound:
+                ws = self._add_worksheet('GitHub_Actions_Log', rows=1000, cols=10)
                 ws.append_row([
                     'Timestamp', 'Run Number', 'Action', 'Details', 
                     'Activities Count', 'Time Range', 'Status'
@@ -829,22 +1214,39 @@ class UltraFastMetaActivityTracker:
                     'horizontalAlignment': 'CENTER'
                 })
             
-            timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            run_number = os.getenv('GITHUB_RUN_NUMBER', 'manual')
-            
-            ws.append_row([
-                timestamp,
-                run_number,
-                action,
-                details,
-                '',
-                '',
-                '✅ Success' if 'Success' in action or 'Completed' in action else '🔄 In Progress'
-            ])
+            ws.append_rows(self.pending_logs)
+            self.pending_logs = []
             
         except Exception as e:
             print(f"⚠️ Could not log to GitHub Actions sheet: {e}")
 
+    @classmethod
+    def _activity_keys(cls, frame):
+        """(Account_ID, Object_Name, Timestamp, Action) per row, hashed into one uint64"""
+        keys = frame.reindex(columns=list(cls.DEDUP_KEY_COLUMNS), fill_value='').astype(str)
+        return pd.util.hash_pandas_object(keys, index=False)
+
+    @staticmethod
+    def _sheet_cell(value):
+        """
+        One cell for a USER_ENTERED write; anything but text and plain numbers (Airtable list/dict
+        fields, timestamps, numpy scalars) is sent as its str() text, as the full rewrite always did
+        """
+        if not isinstance(value, (str, int, float)):
+            return str(value)
+        if isinstance(value, str) and value.startswith(('=', "'")):
+            return "'" + value
+        return value
+
+    @classmethod
+    def _sheet_values(cls, frame):
+        """
+        Rows for a USER_ENTERED write: blanks for NaN, numbers kept as numbers, and a leading '
+        so text starting with '=' (or ') stays plain text instead of being parsed as a formula
+        """
+        rows = frame.astype(object).where(frame.notna(), '').values.tolist()
+        return [[cls._sheet_cell(v) for v in row] for row in rows]
+
     def upload_to_sheets(self, df, sheet='Meta_Activities_Log', append_mode=False):
         """Upload to Google Sheets with deduplication"""
         if not self.gspread_client or df.empty:
@@ -853,51 +1255,67 @@ class UltraFastMetaActivityTracker:
         print(f"\n{'='*80}\nUPLOADING TO SHEETS\n{'='*80}")
         
         try:
-            sh = self.gspread_client.open_by_key(self.google_spreadsheet_id)
-            
             new_activities_count = 0
             
             if append_mode:
-                existing = self.read_existing_data_from_sheets(sheet)
+                # Same layout as the frame: the key columns are enough to dedup and insert the delta
+                existing = self.read_existing_keys_from_sheets(list(df.columns), sheet)
+                same_layout = existing is not None
+                if not same_layout:
+                    existing = self.read_existing_data_from_sheets(sheet)
                 if not existing.empty:
-                    def uid(r):
-                        return f"{r['Account_ID']}_{r.get('Object_Name','')}_{r['Timestamp']}_{r['Action']}"
-                    
-                    existing['_uid'] = existing.apply(uid, axis=1)
-                    df['_uid'] = df.apply(uid, axis=1)
-                    
-                    existing_ids = set(existing['_uid'])
-                    new_df = df[~df['_uid'].isin(existing_ids)].copy()
+                    is_known = self._activity_keys(df).isin(self._activity_keys(existing))
+                    new_df = df[~is_known.to_numpy()].copy()
                     new_activities_count = len(new_df)
                     
                     print(f"   Existing: {len(existing)}, New fetch: {len(df)}, Truly new: {new_activities_count}")
                     
                     if len(new_df) > 0:
+                        # Log new activities added
+                        newest_timestamp = new_df['Timestamp'].max()
+                        oldest_timestamp = new_df['Timestamp'].min()
+                        self.log_github_activity(
+                            f'➕ Added {new_activities_count} New Activities',
+                            f'Range: {oldest_timestamp} to {newest_timestamp}'
+                        )
+                        
+                        if same_layout:
+                            # Same layout as the sheet: send only the delta, newest first, under the header
+                            new_df = new_df.sort_values('Timestamp', ascending=False)
+                            values = self._sheet_values(new_df)
+                            ws = self._get_worksheet(sheet)
+                            for start in range(0, len(values), self.SHEET_WRITE_CHUNK):
+                                # Each chunk goes directly below the previous one to keep newest-first order
+                                ws.insert_rows(values[start:start + self.SHEET_WRITE_CHUNK], row=2 + start,
+                                               value_input_option='USER_ENTERED')
+                            print(f"✅ Inserted {new_activities_count} NEW rows above {len(existing)} existing")
+                            print(f"🔗 https://docs.google.com/spreadsheets/d/{self.google_spreadsheet_id}")
+                            return
+                        
                         combined = pd.concat([existing, new_df], ignore_index=True)
-                        combined = combined.drop('_uid', axis=1).sort_values('Timestamp', ascending=False)
+                        combined = combined.sort_values('Timestamp', ascending=False)
                         df = combined
-                        
-                        # Log new activities added
-                        if new_activities_count > 0:
-                            newest_timestamp = new_df['Timestamp'].max()
-                            oldest_timestamp = new_df['Timestamp'].min()
-                            self.log_github_activity(
-                                f'➕ Added {new_activities_count} New Activities',
-                                f'Range: {oldest_timestamp} to {newest_timestamp}'
-                            )
                     else:
-                        print("   ℹ️ No new activities")
-                        df = existing.drop('_uid', axis=1)
+                        print("   ℹ️ No new activities, sheet left as is")
+                        return
             
             try:
-                ws = sh.worksheet(sheet)
-                ws.clear()
+                ws = self._get_worksheet(sheet)
             except:
-                ws = sh.add_worksheet(title=sheet, rows=max(1000, len(df)+50), cols=max(20, len(df.columns)+5))
+                ws = self._add_worksheet(sheet, rows=max(1000, len(df)+50), cols=max(20, len(df.columns)+5))
             
-            set_with_dataframe(ws, df, include_index=False, include_column_header=True)
-            ws.format('1:1', {'textFormat': {'bold': True}, 'backgroundColor': {'red': 0.2, 'green': 0.6, 'blue': 0.2}})
-            ws.freeze(rows=1)
+            # Shrinking the grid to the frame drops leftover rows and the writes cover every other cell,
+            # so there is no separate clear() round trip
+            ws.resize(rows=len(df) + 1, cols=len(df.columns))
+            values = [list(df.columns)] + self._sheet_values(df)
+            spreadsheet = self._get_spreadsheet()
+            for start in range(0, len(values), self.SHEET_WRITE_CHUNK):
+                spreadsheet.values_update(
+                    absolute_range_name(sheet, f'A{start + 1}'), params={'valueInputOption': 'USER_ENTERED'},
+                    body={'values': values[start:start + self.SHEET_WRITE_CHUNK]})
+            # Resizing keeps formatting, so the header style only needs applying until the row is frozen
+            if not ws.frozen_row_count:
+                self._style_header_row(ws)
             
             print(f"✅ Uploaded {len(df)} rows")
             if new_activities_count > 0:
@@ -908,6 +1326,12 @@ class UltraFastMetaActivityTracker:
 
     def run(self, hours=24, append_mode=False, save_csv=False):
         """Main execution pipeline - ULTRA FAST!"""
+        try:
+            return self._run_pipeline(hours, append_mode, save_csv)
+        finally:
+            self.flush_github_logs()
+
+    def _run_pipeline(self, hours, append_mode, save_csv):
         start = time.time()
         
         print("="*80)
@@ -938,9 +1362,20 @@ class UltraFastMetaActivityTracker:
         
         # Log tracker start
         self.log_github_activity('🚀 Tracker Started', f'Ultra-fast mode: Fetching last {hours}h with batch API')
-        
-        self.brand_mapping_df = self.fetch_airtable_data()
-        df = self.fetch_meta_activities(hours=hours)
+        # Log rows are flushed at each step boundary (run() flushes again as a backstop) so a
+        # timeout or kill during a later step doesn't lose them
+        self.flush_github_logs()
+        
+        # The Airtable brand table doesn't depend on the Meta fetch, so load it in the background meanwhile
+        with ThreadPoolExecutor(max_workers=1) as airtable_loader:
+            # Its progress lines are held back so they don't interleave with the Meta fetch output
+            airtable_log = []
+            airtable_future = airtable_loader.submit(self.fetch_airtable_data, airtable_log.append)
+            df = self.fetch_meta_activities(hours=hours)
+            self.brand_mapping_df = airtable_future.result()
+        for line in airtable_log:
+            print(line)
+        self.flush_github_logs()
         
         if df.empty:
             print("\n✅ No activities found")
@@ -948,12 +1383,13 @@ class UltraFastMetaActivityTracker:
             return df
         
         final = self.map_airtable_to_activities(df)
+        final = self._categorize_repeated_columns(final)
         
         # Summary
         time_range = f"{final['Timestamp'].min()} to {final['Timestamp'].max()}" if 'Timestamp' in final.columns else 'N/A'
         
         print(f"\n{'='*80}\n📊 SUMMARY\n{'='*80}")
-        print(f"Total: {len(final)} | Brands: {final['Brand'].nunique()} | Actors: {final['Actor'].nunique()}")
+        print(f"Total: {len(final)} | Brands: {self._distinct_count(final['Brand'])} | Actors: {self._distinct_count(final['Actor'])}")
         print(f"Time: {time_range}")
         print(f"Active accounts with activity: {self.debug_stats['accounts_with_activity']}/{self.debug_stats['accounts_active']}")
         
@@ -964,6 +1400,7 @@ class UltraFastMetaActivityTracker:
         
         if self.gspread_client:
             self.upload_to_sheets(final, append_mode=append_mode)
+            self.flush_github_logs()
         
         duration = (time.time() - start) / 60
         
@@ -983,54 +1420,52 @@ class UltraFastMetaActivityTracker:
 # ============ MAIN ============
 if __name__ == "__main__":
     import sys
+    import argparse
+    
+    def positive_int(value):
+        number = int(value)
+        if number < 1:
+            raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+        return number
+    
+    parser = argparse.ArgumentParser(description="Track human Meta ad activity into Google Sheets")
+    parser.add_argument("hours", nargs="?", type=positive_int, default=12,
+                        help="Fetch window in hours when the sheet has no previous entries (default: 12)")
+    parser.add_argument("--workers", type=positive_int, default=10,
+                        help="Concurrent account fetches (default: 10)")
+    args = parser.parse_args()
     
     print("\n" + "="*80)
     print("⚡ ULTRA-FAST META TRACKER - BATCH API")
     print("="*80)
     
-    META_ACCESS_TOKEN = os.getenv("META_ACCESS_TOKEN")
-    AIRTABLE_TOKEN = os.getenv("AIRTABLE_TOKEN")
-    AIRTABLE_BASE_ID = os.getenv("AIRTABLE_BASE_ID")
-    AIRTABLE_TABLE_NAME = os.getenv("AIRTABLE_TABLE_NAME")
+    REQUIRED_ENV = ("META_ACCESS_TOKEN", "AIRTABLE_TOKEN", "AIRTABLE_BASE_ID",
+                    "AIRTABLE_TABLE_NAME", "GOOGLE_SPREADSHEET_ID")
+    config = {name: os.getenv(name) for name in REQUIRED_ENV}
     GOOGLE_CREDENTIALS_PATH = os.getenv("GOOGLE_CREDENTIALS_PATH", "google_credentials.json")
-    GOOGLE_SPREADSHEET_ID = os.getenv("GOOGLE_SPREADSHEET_ID")
-
-    missing = []
-    if not META_ACCESS_TOKEN:
-        missing.append("META_ACCESS_TOKEN")
-    if not AIRTABLE_TOKEN:
-        missing.append("AIRTABLE_TOKEN")
-    if not AIRTABLE_BASE_ID:
-        missing.append("AIRTABLE_BASE_ID")
-    if not AIRTABLE_TABLE_NAME:
-        missing.append("AIRTABLE_TABLE_NAME")
-    if not GOOGLE_SPREADSHEET_ID:
-        missing.append("GOOGLE_SPREADSHEET_ID")
-    
+    META_CACHE_PATH = os.getenv("META_CACHE_PATH", ".meta_cache.sqlite")
+
+    missing = [name for name, value in config.items() if not value]
     if missing:
         print("❌ Missing env vars:", ", ".join(missing))
         sys.exit(1)
     
-    hours = 12
-    if len(sys.argv) > 1:
-        try:
-            hours = int(sys.argv[1])
-        except:
-            pass
+    hours = args.hours
     
     print(f"\n📋 Config: hours={hours}, timestamp={datetime.now()}")
     print("="*80 + "\n")
     
     try:
         tracker = UltraFastMetaActivityTracker(
-            meta_access_token=META_ACCESS_TOKEN,
-            airtable_token=AIRTABLE_TOKEN,
-            airtable_base_id=AIRTABLE_BASE_ID,
-            airtable_table_name=AIRTABLE_TABLE_NAME,
+            meta_access_token=config["META_ACCESS_TOKEN"],
+            airtable_token=config["AIRTABLE_TOKEN"],
+            airtable_base_id=config["AIRTABLE_BASE_ID"],
+            airtable_table_name=config["AIRTABLE_TABLE_NAME"],
             google_credentials_path=GOOGLE_CREDENTIALS_PATH,
-            google_spreadsheet_id=GOOGLE_SPREADSHEET_ID,
-            max_workers=10,
-            debug_mode=False
+            google_spreadsheet_id=config["GOOGLE_SPREADSHEET_ID"],
+            max_workers=args.workers,
+            debug_mode=False,
+            cache_path=META_CACHE_PATH
         )
         
         results = tracker.run(hours=hours, append_mode=True, save_csv=False)
@@ -1039,7 +1474,7 @@ if __name__ == "__main__":
         print("⚡ SUCCESS - ULTRA FAST!")
         print("="*80)
         print(f"Activities: {len(results)}")
-        print(f"Brands: {results['Brand'].nunique() if not results.empty else 0}")
+        print(f"Brands: {tracker._distinct_count(results['Brand']) if not results.empty else 0}")
         print(f"API calls saved: {tracker.debug_stats['batch_savings']}")
         print(f"Speedup: ~{tracker.debug_stats['batch_savings']/50:.0f}x faster!")
         print("="*80 + "\n")